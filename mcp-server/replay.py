@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+MCP Server Trace Replay
+
+Re-drives tool call traces recorded by the server (TRACE_PATH) against a
+running MCP server, or against the server in-process with a real or mocked
+Elasticsearch backend, and compares latency distributions between runs.
+
+    python replay.py run trace.log --url http://localhost:9876/mcp/ --output run.ndjson
+    python replay.py run trace.log --mock-es --speed 4 --output mock.ndjson
+    python replay.py compare trace.log mock.ndjson
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional, TextIO
+
+from fastmcp import Client
+
+def load_traces(paths: List[str]) -> List[Dict[str, Any]]:
+    """Read trace records from one or more files, ordered by start time"""
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "tool" in record and "ts" in record:
+                    records.append(record)
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(values)), 1)
+    return values[rank - 1]
+
+def server_ms(record: Dict[str, Any]) -> Optional[float]:
+    """
+    Time the tool itself ran inside the server.
+
+    Server traces store it as `ms`. Replay results store the client round trip
+    as `client_ms` and, for in-process replays, the server time as `server_ms`.
+    """
+    if "client_ms" in record:
+        return record.get("server_ms")
+    return record.get("ms")
+
+def client_ms(record: Dict[str, Any]) -> Optional[float]:
+    """Client round trip of a replayed call, including MCP transport overhead"""
+    return record.get("client_ms")
+
+def latency_field(baseline: List[Dict[str, Any]], candidate: List[Dict[str, Any]]):
+    """
+    Pick the latency both runs measured the same way.
+
+    Prefers server-side time and falls back to client round trips. Returns None
+    when the runs share neither, e.g. a server trace and a remote replay.
+    """
+    for field in (server_ms, client_ms):
+        if all(field(record) is not None for record in baseline + candidate):
+            return field
+    return None
+
+def latency_summary(records: List[Dict[str, Any]], field=server_ms) -> Dict[str, Dict[str, float]]:
+    """Summarize latencies per tool, plus an 'all' row and, where recorded, rows split by cache hit/miss"""
+    groups: Dict[str, List[Dict[str, Any]]] = {"all": records}
+    for record in records:
+        groups.setdefault(record["tool"], []).append(record)
+    for record in records:
+        if "cache" in record:
+            groups.setdefault(f"{record['tool']} ({record['cache']})", []).append(record)
+
+    summary = {}
+    for tool, group in groups.items():
+        latencies = sorted(field(record) for record in group)
+        summary[tool] = {
+            "count": len(group),
+            "errors": sum(1 for record in group if not record.get("ok", True)),
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else 0.0,
+        }
+    return summary
+
+def mock_elasticsearch(latency_ms: float):
+    """Build a stand-in for server.elasticsearch_request returning synthetic responses"""
+    fragment = "The <mark>quarterly</mark> audit report lists the evidence reviewed for each contract. " * 6
+
+    async def elasticsearch_request(method: str, endpoint: str, data: Optional[Dict] = None) -> Dict[str, Any]:
+        await asyncio.sleep(latency_ms / 1000)
+        if endpoint.endswith("_search"):
+            size = (data or {}).get("size", 5)
+            hits = [
+                {
+                    "_id": f"doc-{i}",
+                    "_score": 1.0 / (i + 1),
+                    "_source": {"file": {"filename": f"report-{i}.pdf"}, "path": {"virtual": f"/reports/report-{i}.pdf"}, "content_hash": f"hash-{i}"},
+                    "highlight": {"content": [fragment] * 5}
+                }
+                for i in range(size)
+            ]
+            return {"hits": {"total": {"value": 1000}, "max_score": 1.0, "hits": hits}}
+        if endpoint.endswith("_count"):
+            return {"count": 1000}
+        if endpoint.startswith("_cat/indices"):
+            return [{"index": "documents", "docs.count": "1000", "store.size": "10mb"}]
+        if endpoint == "_cluster/health":
+            return {"status": "green", "cluster_name": "mock", "number_of_nodes": 1, "active_primary_shards": 1, "active_shards": 1}
+        if endpoint == "":
+            return {"version": {"number": "mock"}}
+        if "/_doc/" in endpoint:
+            index, _, document_id = endpoint.partition("/_doc/")
+            return {"_id": document_id, "_index": index, "found": True, "_source": {"content": fragment}, "_version": 1}
+        return {}
+
+    return elasticsearch_request
+
+def take_server_record(server_records: List[Dict[str, Any]], tool: str, arguments: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Remove and return the first in-process server trace record matching a replayed call"""
+    for i, record in enumerate(server_records):
+        if record["tool"] == tool and all(record["args"].get(name) == value for name, value in arguments.items()):
+            return server_records.pop(i)
+    return None
+
+async def replay(
+    records: List[Dict[str, Any]],
+    client: Client,
+    speed: float,
+    concurrency: int,
+    out: TextIO,
+    server_records: Optional[List[Dict[str, Any]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Re-issue recorded tool calls, keeping their original spacing divided by speed.
+
+    A speed of 0 sends calls as fast as the concurrency limit allows. Each
+    result records the client round trip as client_ms. When the server runs
+    in-process, server_records collects its trace records so each result also
+    reports the server-side time as server_ms and whether the cache was hit.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+    first_ts = records[0]["ts"] if records else 0.0
+    started = time.perf_counter()
+
+    async def call(record: Dict[str, Any]) -> None:
+        offset = (record["ts"] - first_ts) / speed if speed > 0 else 0.0
+        delay = offset - (time.perf_counter() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async with semaphore:
+            call_ts = time.time()
+            start = time.perf_counter()
+            ok = True
+            try:
+                await client.call_tool(record["tool"], record.get("args", {}))
+            except Exception:
+                ok = False
+            result = {
+                "ts": round(call_ts, 6),
+                "tool": record["tool"],
+                "args": record.get("args", {}),
+                "client_ms": round((time.perf_counter() - start) * 1000, 3),
+                "ok": ok,
+                "lag_ms": round((start - started - offset) * 1000, 3)
+            }
+            if server_records is not None:
+                server_record = take_server_record(server_records, record["tool"], record.get("args", {}))
+                if server_record:
+                    result["server_ms"] = server_record["ms"]
+                    if "cache" in server_record:
+                        result["cache"] = server_record["cache"]
+        results.append(result)
+        out.write(json.dumps(result, separators=(",", ":"), default=str) + "\n")
+
+    await asyncio.gather(*(call(record) for record in records))
+    out.flush()
+    return results
+
+def print_summary(summary: Dict[str, Dict[str, float]], out: TextIO) -> None:
+    """Print a latency table"""
+    out.write(f"{'tool':<24} {'count':>7} {'errors':>7} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}\n")
+    for tool, row in summary.items():
+        out.write(
+            f"{tool:<24} {row['count']:>7} {row['errors']:>7} {row['mean']:>9.1f} {row['p50']:>9.1f} "
+            f"{row['p90']:>9.1f} {row['p99']:>9.1f} {row['max']:>9.1f}\n"
+        )
+
+def print_comparison(baseline: Dict[str, Dict[str, float]], candidate: Dict[str, Dict[str, float]], out: TextIO) -> None:
+    """Print latency percentiles of two runs side by side with the relative change"""
+    def change(before: float, after: float) -> str:
+        return f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+
+    out.write(f"{'tool':<24} {'stat':<5} {'baseline':>10} {'candidate':>10} {'change':>9}\n")
+    for tool in baseline:
+        if tool not in candidate:
+            continue
+        for stat in ("mean", "p50", "p90", "p99"):
+            before, after = baseline[tool][stat], candidate[tool][stat]
+            out.write(f"{tool:<24} {stat:<5} {before:>10.1f} {after:>10.1f} {change(before, after):>9}\n")
+        out.write(f"{tool:<24} {'count':<5} {baseline[tool]['count']:>10} {candidate[tool]['count']:>10}\n")
+
+async def run_in_process(records: List[Dict[str, Any]], args: argparse.Namespace, out: TextIO) -> List[Dict[str, Any]]:
+    """
+    Replay against the server running in this process.
+
+    The server gets a fresh cache file in a temporary directory so runs never
+    see each other's cached results, or no cache at all with --no-cache.
+    """
+    with tempfile.TemporaryDirectory(prefix="es-mcp-replay-") as workdir:
+        # The server reads its configuration at import time
+        os.environ["CACHE_PATH"] = os.path.join(workdir, "cache.sqlite3")
+        os.environ["TRACE_PATH"] = os.path.join(workdir, "trace.log")
+        if not args.cache:
+            os.environ["CACHE_TTL_SECONDS"] = "0"
+        import server
+
+        if args.mock_es:
+            server.elasticsearch_request = mock_elasticsearch(args.mock_latency_ms)
+        server_records = []
+        server.trace_hooks.append(server_records.append)
+        try:
+            async with Client(server.mcp) as client:
+                return await replay(records, client, args.speed, args.concurrency, out, server_records)
+        finally:
+            server.trace_hooks.remove(server_records.append)
+            await server.cleanup()
+
+async def run_command(args: argparse.Namespace) -> int:
+    """Replay traces and print a latency summary to stderr"""
+    records = load_traces(args.traces)
+    if not records:
+        sys.stderr.write("No trace records found\n")
+        return 1
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if args.mock_es or args.in_process:
+            results = await run_in_process(records, args, out)
+        else:
+            async with Client(args.url) as client:
+                results = await replay(records, client, args.speed, args.concurrency, out)
+    finally:
+        if args.output:
+            out.close()
+
+    sys.stderr.write("Client round trip (ms)\n")
+    print_summary(latency_summary(results, client_ms), sys.stderr)
+    if all(server_ms(result) is not None for result in results):
+        sys.stderr.write("\nServer-side (ms)\n")
+        print_summary(latency_summary(results, server_ms), sys.stderr)
+    return 1 if any(not result["ok"] for result in results) else 0
+
+def compare_command(args: argparse.Namespace) -> int:
+    """Compare the latency distributions of two traces or replay outputs, measured the same way"""
+    baseline = load_traces([args.baseline])
+    candidate = load_traces([args.candidate])
+    field = latency_field(baseline, candidate)
+    if field is None:
+        sys.stderr.write(
+            "Cannot compare: one run has only client round trips (a replay against --url) and the other "
+            "only server-side times. Compare the server's TRACE_PATH traces, or replay both runs the same way.\n"
+        )
+        return 2
+
+    sys.stdout.write(f"Latency: {'server-side' if field is server_ms else 'client round trip'} (ms)\n")
+    print_comparison(latency_summary(baseline, field), latency_summary(candidate, field), sys.stdout)
+    return 0
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Replay recorded MCP tool calls and compare latencies")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Replay trace files against a server")
+    run.add_argument("traces", nargs="+", help="Trace files recorded with TRACE_PATH (rotated files included)")
+    run.add_argument("--url", default="http://localhost:9876/mcp/", help="MCP server URL (default: %(default)s)")
+    run.add_argument("--in-process", action="store_true", help="Run the server in this process instead of connecting to --url")
+    run.add_argument("--mock-es", action="store_true", help="Run the server in-process against a mocked Elasticsearch")
+    run.add_argument("--mock-latency-ms", type=float, default=20.0, help="Latency of each mocked Elasticsearch request (default: 20)")
+    run.add_argument("--no-cache", dest="cache", action="store_false", help="Disable the result cache of the in-process server")
+    run.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier, 0 for no pacing (default: 1)")
+    run.add_argument("--concurrency", type=int, default=32, help="Maximum calls in flight (default: 32)")
+    run.add_argument("--output", help="Write per-call results as NDJSON to this file instead of stdout")
+
+    compare = commands.add_parser("compare", help="Compare latency distributions of two runs")
+    compare.add_argument("baseline", help="Trace file or replay output")
+    compare.add_argument("candidate", help="Trace file or replay output")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the selected command and return the process exit code"""
+    args = parse_args(argv)
+    if args.command == "run":
+        return asyncio.run(run_command(args))
+    return compare_command(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Elasticsearch Bulk Search CLI
+
+Runs many searches from stdin or a file over one pooled Elasticsearch
+connection, using the same query builders as the MCP server, and streams the
+results as NDJSON.
+
+Each input line is either a plain query string or a JSON object such as
+{"query": "annual report", "tool": "hybrid_search", "size": 3}.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from typing import Dict, Any, List, Optional, TextIO
+
+# Default to the host-exposed port, like the curl scripts in search_scripts/
+os.environ.setdefault("ES_HOST", "https://localhost:9200")
+# Keep bulk runs out of the server's shared result cache unless asked for
+os.environ.setdefault("CACHE_TTL_SECONDS", "0")
+
+import server
+
+BUILDERS = {
+    "search": server.build_search_body,
+    "semantic_search": server.build_semantic_search_body,
+    "hybrid_search": server.build_hybrid_search_body,
+}
+
+HYBRID_OPTIONS = ("rank_window_size", "rank_constant")
+
+INT_OPTIONS = ("size", "fragment_size", "num_fragments", "rank_window_size", "rank_constant")
+BOOL_OPTIONS = ("highlight", "dedup")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Run many Elasticsearch searches and stream the results as NDJSON")
+    parser.add_argument("--file", help="Read queries from this file instead of stdin")
+    parser.add_argument("--tool", choices=sorted(BUILDERS), default="search", help="Search type (default: search)")
+    parser.add_argument("--index", default=server.ES_DEFAULT_INDEX, help="Index to search (default: %(default)s)")
+    parser.add_argument("--size", type=int, default=5, help="Number of results per query (default: 5)")
+    parser.add_argument("--no-highlight", dest="highlight", action="store_false", help="Return content instead of highlighted fragments")
+    parser.add_argument("--fragment-size", type=int, default=600, help="Size of highlighted fragments (default: 600)")
+    parser.add_argument("--num-fragments", type=int, default=5, help="Number of fragments per document (default: 5)")
+    parser.add_argument("--rank-window-size", type=int, default=50, help="RRF rank window size for hybrid_search (default: 50)")
+    parser.add_argument("--rank-constant", type=int, default=20, help="RRF rank constant for hybrid_search (default: 20)")
+    parser.add_argument("--no-dedup", dest="dedup", action="store_false", help="Do not collapse duplicate documents")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once (default: 8)")
+    parser.add_argument("--msearch", action="store_true", help="Send queries in batches through _msearch")
+    parser.add_argument("--batch-size", type=int, default=50, help="Queries per _msearch request (default: 50)")
+    return parser.parse_args(argv)
+
+def parse_line(line: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Turn an input line into a search spec, filling in defaults from the command line"""
+    spec = {
+        "tool": args.tool,
+        "index": args.index,
+        "size": args.size,
+        "highlight": args.highlight,
+        "fragment_size": args.fragment_size,
+        "num_fragments": args.num_fragments,
+        "rank_window_size": args.rank_window_size,
+        "rank_constant": args.rank_constant,
+        "dedup": args.dedup,
+    }
+    if line.startswith("{"):
+        spec.update(json.loads(line))
+    else:
+        spec["query"] = line
+
+    if spec["tool"] not in BUILDERS:
+        raise ValueError(f"Unknown tool: {spec['tool']}")
+    if not spec.get("query") or not isinstance(spec["query"], str):
+        raise ValueError("Missing query")
+    if not isinstance(spec["index"], str):
+        raise ValueError("index must be a string")
+    for name in INT_OPTIONS:
+        # bool is a subclass of int, so reject it explicitly
+        if not isinstance(spec[name], int) or isinstance(spec[name], bool):
+            raise ValueError(f"{name} must be an integer")
+    for name in BOOL_OPTIONS:
+        if not isinstance(spec[name], bool):
+            raise ValueError(f"{name} must be true or false")
+    return spec
+
+def build_body(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the search body for a spec with the server's query builders"""
+    options = {
+        "size": spec["size"],
+        "highlight": spec["highlight"],
+        "fragment_size": spec["fragment_size"],
+        "num_fragments": spec["num_fragments"],
+    }
+    if spec["tool"] == "hybrid_search":
+        options.update({name: spec[name] for name in HYBRID_OPTIONS})
+    return BUILDERS[spec["tool"]](spec["query"], **options)
+
+def write_result(out: TextIO, line_number: int, spec: Optional[Dict[str, Any]], results: Any = None, error: Optional[str] = None) -> None:
+    """Write one NDJSON result record"""
+    record = {"line": line_number}
+    if spec:
+        record.update({"tool": spec["tool"], "index": spec["index"], "query": spec["query"]})
+    if error is None:
+        record["results"] = results
+    else:
+        record["error"] = error
+    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    out.flush()
+
+async def run_single(batch: List[tuple], out: TextIO) -> int:
+    """Run each query of a batch as its own _search request"""
+    failures = 0
+    for line_number, spec in batch:
+        try:
+            results = await server.search_unique(spec["index"], build_body(spec), spec["size"], spec["dedup"])
+            write_result(out, line_number, spec, results)
+        except Exception as e:
+            write_result(out, line_number, spec, error=str(e))
+            failures += 1
+    return failures
+
+async def run_msearch(batch: List[tuple], out: TextIO) -> int:
+    """
+    Run a batch of queries as one _msearch request, over-fetching once for dedup.
+
+    Queries still short of `size` unique documents after collapsing are re-run
+    through server.search_unique, which widens the window until they are filled.
+    """
+    failures = 0
+    lines = []
+    built = []
+    for line_number, spec in batch:
+        try:
+            body = build_body(spec)
+            if spec["dedup"]:
+                body = server.resize_search_body(body, server.dedup_fetch_size(spec["size"]))
+            request = [json.dumps({"index": spec["index"]}), json.dumps(body)]
+        except Exception as e:
+            write_result(out, line_number, spec, error=str(e))
+            failures += 1
+            continue
+        lines.extend(request)
+        built.append((line_number, spec))
+
+    if not built:
+        return failures
+
+    client = await server.get_elasticsearch_client()
+    try:
+        response = await client.post(
+            f"{server.ES_HOST}/_msearch",
+            content="\n".join(lines) + "\n",
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        response.raise_for_status()
+        responses = response.json()["responses"]
+    except Exception as e:
+        for line_number, spec in built:
+            write_result(out, line_number, spec, error=f"Elasticsearch request failed: {str(e)}")
+        return failures + len(built)
+
+    for (line_number, spec), result in zip(built, responses):
+        if "error" in result:
+            write_result(out, line_number, spec, error=json.dumps(result["error"]))
+            failures += 1
+            continue
+
+        try:
+            formatted_results = server.format_search_results(result)
+            if spec["dedup"]:
+                fetch_size = server.dedup_fetch_size(spec["size"])
+                fetched = len(formatted_results["documents"])
+                formatted_results = await asyncio.to_thread(server.collapse_results, formatted_results, spec["size"])
+                if (len(formatted_results["documents"]) < spec["size"] and fetched >= fetch_size
+                        and fetch_size < server.DEDUP_MAX_FETCH):
+                    # Too many duplicates for one over-fetch: widen the window like the tools do
+                    formatted_results = await server.search_unique(spec["index"], build_body(spec), spec["size"], True)
+            else:
+                for document in formatted_results["documents"]:
+                    document["source"].pop("content_hash", None)
+        except Exception as e:
+            write_result(out, line_number, spec, error=str(e))
+            failures += 1
+            continue
+        write_result(out, line_number, spec, formatted_results)
+    return failures
+
+async def read_batches(stream: TextIO, args: argparse.Namespace, queue: asyncio.Queue, out: TextIO) -> int:
+    """Read input lines into batches on the work queue, reporting lines that do not parse"""
+    batch_size = args.batch_size if args.msearch else 1
+    batch = []
+    failures = 0
+    line_number = 0
+    while True:
+        line = await asyncio.to_thread(stream.readline)
+        if not line:
+            break
+        line_number += 1
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            batch.append((line_number, parse_line(line, args)))
+        except ValueError as e:
+            write_result(out, line_number, None, error=str(e))
+            failures += 1
+            continue
+
+        if len(batch) >= batch_size:
+            await queue.put(batch)
+            batch = []
+
+    if batch:
+        await queue.put(batch)
+    return failures
+
+async def worker(queue: asyncio.Queue, msearch: bool, out: TextIO) -> int:
+    """Take batches off the queue until it is closed"""
+    failures = 0
+    while True:
+        batch = await queue.get()
+        if batch is None:
+            return failures
+        if msearch:
+            failures += await run_msearch(batch, out)
+        else:
+            failures += await run_single(batch, out)
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    """Run all queries and return the process exit code"""
+    args = parse_args(argv)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    stream = open(args.file, encoding="utf-8") if args.file else sys.stdin
+    concurrency = max(args.concurrency, 1)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    workers = [asyncio.create_task(worker(queue, args.msearch, sys.stdout)) for _ in range(concurrency)]
+
+    try:
+        failures = await read_batches(stream, args, queue, sys.stdout)
+        for _ in workers:
+            await queue.put(None)
+        failures += sum(await asyncio.gather(*workers))
+    finally:
+        if args.file:
+            stream.close()
+        await server.cleanup()
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -7,10 +7,23 @@ including normal search, semantic search, and hybrid search using the E5 model.
 """
 
 import asyncio
+import contextvars
+import copy
+import functools
+import hashlib
+import inspect
 import json
 import logging
+import logging.handlers
 import os
 import re
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
 from typing import Dict, Any, List, Optional, Union
 from urllib.parse import quote_plus
 
@@ -27,12 +40,57 @@ ES_USER = os.getenv("ES_USER", "elastic")
 ES_PASS = os.getenv("ES_PASS", "changeme")
 ES_DEFAULT_INDEX = os.getenv("ES_DEFAULT_INDEX", "documents")
 
+# Server configuration from environment variables
+MCP_HOST = os.getenv("MCP_HOST", "0.0.0.0")
+MCP_PORT = int(os.getenv("MCP_PORT", "8080"))
+MCP_WORKERS = int(os.getenv("MCP_WORKERS", "1"))
+
+# Search result cache shared by all worker processes (0 disables it)
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+# The default lives in a directory private to the current user, so other local
+# users can neither read cached documents nor plant results
+CACHE_DIR = os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+    f"es-mcp-cache-{os.getuid()}" if hasattr(os, "getuid") else "es-mcp-cache"
+)
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(CACHE_DIR, "cache.sqlite3"))
+CACHE_PURGE_INTERVAL = 60.0
+CACHE_COUNTER_FLUSH = 100
+CACHE_COUNTER_FLUSH_INTERVAL = 5.0
+
+# Duplicate collapsing: initial over-fetch factor and the largest window to fetch
+DEDUP_OVERFETCH = int(os.getenv("DEDUP_OVERFETCH", "2"))
+DEDUP_MAX_FETCH = int(os.getenv("DEDUP_MAX_FETCH", "100"))
+SIMHASH_MAX_DISTANCE = 3
+SIMHASH_MAX_CHARS = 8192
+
+# Tool call recording for load testing (unset disables it)
+TRACE_PATH = os.getenv("TRACE_PATH")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "5"))
+
 # Create MCP server
 mcp = FastMCP(name="Elasticsearch Search Server")
 
 # Global HTTP client for Elasticsearch
 es_client = None
 
+# Logger writing tool call traces, created on first use
+trace_logger = None
+
+# Callbacks receiving every trace record, used by in-process replays
+trace_hooks = []
+
+# Cache lookups ("hit"/"miss") made during the current traced tool call
+cache_lookups = contextvars.ContextVar("cache_lookups", default=None)
+
+# Per-thread cache connections and per-process cache bookkeeping
+cache_local = threading.local()
+cache_schema_lock = threading.Lock()
+cache_schema_ready = False
+cache_last_purge = 0.0
+cache_pending = {"cache_hits": 0, "cache_misses": 0}
+
 async def get_elasticsearch_client():
     """Get or create Elasticsearch HTTP client"""
     global es_client
@@ -66,6 +124,226 @@ async def elasticsearch_request(method: str, endpoint: str, data: Optional[Dict]
         logger.error(f"Elasticsearch request failed: {e}")
         raise Exception(f"Elasticsearch request failed: {str(e)}")
 
+def get_trace_logger() -> logging.Logger:
+    """
+    Get or create the logger that writes tool call traces.
+    
+    In multi-worker mode each worker writes its own file (TRACE_PATH.<pid>),
+    since rotating a file shared by several processes is not safe.
+    """
+    global trace_logger
+    if trace_logger is None:
+        path = TRACE_PATH if MCP_WORKERS <= 1 else f"{TRACE_PATH}.{os.getpid()}"
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger = logging.getLogger(f"{__name__}.trace")
+        trace_logger.setLevel(logging.INFO)
+        trace_logger.propagate = False
+        trace_logger.addHandler(handler)
+    return trace_logger
+
+def traced(func):
+    """
+    Record each call of a tool when TRACE_PATH is set.
+    
+    Writes one JSON line per call with the start time, tool name, arguments,
+    latency, whether it succeeded and, for searches, whether the result cache
+    was hit ("hit" only if every lookup hit). Returns the tool unchanged otherwise.
+    """
+    if not TRACE_PATH:
+        return func
+    
+    signature = inspect.signature(func)
+    
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.time()
+        start = time.perf_counter()
+        ok = False
+        lookups = []
+        token = cache_lookups.set(lookups)
+        try:
+            result = await func(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            cache_lookups.reset(token)
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            arguments.pop("ctx", None)
+            record = {
+                "ts": round(started, 6),
+                "tool": func.__name__,
+                "args": arguments,
+                "ms": round((time.perf_counter() - start) * 1000, 3),
+                "ok": ok
+            }
+            if lookups:
+                record["cache"] = "miss" if "miss" in lookups else "hit"
+            for hook in trace_hooks:
+                hook(record)
+            try:
+                get_trace_logger().info(json.dumps(record, separators=(",", ":"), default=str))
+            except Exception as e:
+                logger.warning(f"Trace write failed: {e}")
+    
+    return wrapper
+
+def _cache_prepare() -> None:
+    """
+    Create the cache file readable only by the current user.
+    
+    Refuses a default cache directory or a cache file owned by another user,
+    or a default directory that others can access.
+    """
+    owner = os.getuid() if hasattr(os, "getuid") else None
+    if os.path.dirname(CACHE_PATH) == CACHE_DIR:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        info = os.lstat(CACHE_DIR)
+        if owner is not None and (not stat.S_ISDIR(info.st_mode) or info.st_uid != owner or info.st_mode & 0o077):
+            raise sqlite3.OperationalError(f"Cache directory {CACHE_DIR} must be a directory owned by this user with mode 0700")
+    
+    fd = os.open(CACHE_PATH, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+    try:
+        if owner is not None:
+            if os.fstat(fd).st_uid != owner:
+                raise sqlite3.OperationalError(f"Cache file {CACHE_PATH} is owned by another user")
+            os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+
+def _cache_connect() -> sqlite3.Connection:
+    """Get this thread's connection to the shared cache database, creating the schema once per process"""
+    global cache_schema_ready
+    conn = getattr(cache_local, "conn", None)
+    if conn is None:
+        with cache_schema_lock:
+            if not cache_schema_ready:
+                _cache_prepare()
+                conn = sqlite3.connect(CACHE_PATH, timeout=5.0)
+                with conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+                    conn.execute("CREATE INDEX IF NOT EXISTS results_expires ON results (expires)")
+                    conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                cache_schema_ready = True
+            else:
+                conn = sqlite3.connect(CACHE_PATH, timeout=5.0)
+        cache_local.conn = conn
+    return conn
+
+def _cache_get(key: str) -> Optional[str]:
+    """Look up a cached value"""
+    row = _cache_connect().execute("SELECT value FROM results WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+    return row[0] if row else None
+
+def _cache_put(key: str, value: str) -> None:
+    """Store a value, dropping expired entries at most once per CACHE_PURGE_INTERVAL"""
+    global cache_last_purge
+    now = time.time()
+    conn = _cache_connect()
+    with conn:
+        if now - cache_last_purge >= CACHE_PURGE_INTERVAL:
+            cache_last_purge = now
+            conn.execute("DELETE FROM results WHERE expires <= ?", (now,))
+        conn.execute(
+            "INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, now + CACHE_TTL_SECONDS)
+        )
+
+def _cache_flush_counters(deltas: Dict[str, int]) -> None:
+    """Add this process's counted hits and misses to the shared counters"""
+    conn = _cache_connect()
+    with conn:
+        conn.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [(name, value) for name, value in deltas.items() if value]
+        )
+
+def _cache_counters() -> Dict[str, int]:
+    """Read cache counters aggregated across all worker processes"""
+    conn = _cache_connect()
+    counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+    entries = conn.execute("SELECT COUNT(*) FROM results WHERE expires > ?", (time.time(),)).fetchone()[0]
+    return {
+        "cache_hits": counters.get("cache_hits", 0),
+        "cache_misses": counters.get("cache_misses", 0),
+        "cache_entries": entries
+    }
+
+async def flush_cache_counters() -> None:
+    """Write the hits and misses counted in memory to the shared cache database"""
+    global cache_pending
+    if not any(cache_pending.values()):
+        return
+    deltas, cache_pending = cache_pending, {"cache_hits": 0, "cache_misses": 0}
+    try:
+        await asyncio.to_thread(_cache_flush_counters, deltas)
+    except sqlite3.Error as e:
+        logger.warning(f"Cache counter flush failed: {e}")
+
+async def flush_cache_counters_periodically() -> None:
+    """Flush counted hits and misses every CACHE_COUNTER_FLUSH_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(CACHE_COUNTER_FLUSH_INTERVAL)
+        await flush_cache_counters()
+
+async def read_cache_counters() -> Dict[str, int]:
+    """Flush this process's counts and read the counters of all workers"""
+    await flush_cache_counters()
+    return await asyncio.to_thread(_cache_counters)
+
+async def count_cache_lookup(hit: bool) -> None:
+    """Count a cache hit or miss, flushing to the shared counters in batches"""
+    cache_pending["cache_hits" if hit else "cache_misses"] += 1
+    if sum(cache_pending.values()) >= CACHE_COUNTER_FLUSH:
+        await flush_cache_counters()
+
+async def cached_search(index: str, search_body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run a search and format the results, reusing a cached response when possible.
+    
+    Formatted results are stored in a SQLite database (in /dev/shm when available)
+    so every worker process serves from the same cache. Cache failures never fail
+    the search itself.
+    
+    Args:
+        index: Elasticsearch index to search
+        search_body: Elasticsearch search request body
+    
+    Returns:
+        Formatted search results
+    """
+    if CACHE_TTL_SECONDS <= 0:
+        results = await elasticsearch_request("POST", f"{index}/_search", search_body)
+        return format_search_results(results)
+    
+    # Include the cluster and user so processes sharing CACHE_PATH never mix results
+    key = hashlib.sha256(
+        json.dumps([ES_HOST, ES_USER, index, search_body], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    try:
+        cached = await asyncio.to_thread(_cache_get, key)
+        await count_cache_lookup(cached is not None)
+        lookups = cache_lookups.get()
+        if lookups is not None:
+            lookups.append("hit" if cached is not None else "miss")
+        if cached is not None:
+            return json.loads(cached)
+    except sqlite3.Error as e:
+        logger.warning(f"Cache lookup failed: {e}")
+    
+    results = await elasticsearch_request("POST", f"{index}/_search", search_body)
+    formatted_results = format_search_results(results)
+    
+    try:
+        await asyncio.to_thread(_cache_put, key, json.dumps(formatted_results))
+    except sqlite3.Error as e:
+        logger.warning(f"Cache store failed: {e}")
+    
+    return formatted_results
+
 def remove_html_tags(text: str) -> str:
     """Remove HTML tags from text for comparison purposes"""
     if not text:
@@ -119,6 +397,128 @@ def deduplicate_highlights(highlight_fragments: List[str]) -> List[str]:
     # Return results in original order, using the best highlighted version
     return [seen_texts[plain_text][0] for plain_text in result_order if plain_text in seen_texts]
 
+def simhash(text: str) -> int:
+    """Compute a 64-bit SimHash of the words in the first SIMHASH_MAX_CHARS of a text"""
+    weights = [0] * 64
+    for word, count in Counter(re.findall(r"\w+", text[:SIMHASH_MAX_CHARS].lower())).items():
+        value = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def document_fingerprint(document: Dict[str, Any]) -> Union[str, int, None]:
+    """
+    Get the fingerprint used to detect duplicate documents.
+    
+    Prefers the content_hash set by the ingest pipeline and falls back to a
+    SimHash of the content. Highlighted fragments are never used, since they
+    depend on the query and match across unrelated documents.
+    
+    Args:
+        document: A formatted search result document
+    
+    Returns:
+        The content hash string, a SimHash integer, or None if the document
+        cannot be fingerprinted and must not be collapsed
+    """
+    source = document.get("source", {})
+    if source.get("content_hash"):
+        return source["content_hash"]
+    
+    text = source.get("content")
+    if not text or not isinstance(text, str):
+        return None
+    return simhash(text)
+
+def collapse_duplicates(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Collapse duplicate documents, keeping the highest ranked copy.
+    
+    Args:
+        documents: Formatted search result documents in rank order
+    
+    Returns:
+        Unique documents in rank order, each with the number of copies folded into it
+    """
+    unique = []
+    fingerprints = []
+    for document in documents:
+        fingerprint = document_fingerprint(document)
+        document["source"].pop("content_hash", None)
+        
+        match = None
+        if fingerprint is not None:
+            for i, seen in enumerate(fingerprints):
+                if isinstance(fingerprint, int) and isinstance(seen, int):
+                    if bin(fingerprint ^ seen).count("1") <= SIMHASH_MAX_DISTANCE:
+                        match = i
+                        break
+                elif fingerprint == seen:
+                    match = i
+                    break
+        
+        if match is None:
+            document["duplicates_collapsed"] = 0
+            unique.append(document)
+            fingerprints.append(fingerprint)
+        else:
+            unique[match]["duplicates_collapsed"] += 1
+    
+    return unique
+
+def dedup_fetch_size(size: int) -> int:
+    """Get the number of hits to fetch first when collapsing duplicates"""
+    return min(max(size * DEDUP_OVERFETCH, size), max(DEDUP_MAX_FETCH, size))
+
+def resize_search_body(search_body: Dict[str, Any], size: int) -> Dict[str, Any]:
+    """Copy a search body with a new size, widening the RRF window to match"""
+    body = copy.deepcopy(search_body)
+    body["size"] = size
+    if "retriever" in body:
+        rrf = body["retriever"]["rrf"]
+        rrf["rank_window_size"] = max(rrf["rank_window_size"], size)
+    return body
+
+def collapse_results(results: Dict[str, Any], size: int) -> Dict[str, Any]:
+    """Collapse duplicates in formatted search results and keep the first `size` documents"""
+    results["documents"] = collapse_duplicates(results["documents"])[:size]
+    results["duplicates_collapsed"] = sum(document["duplicates_collapsed"] for document in results["documents"])
+    return results
+
+async def search_unique(index: str, search_body: Dict[str, Any], size: int, dedup: bool) -> Dict[str, Any]:
+    """
+    Run a search and return up to `size` documents with duplicates collapsed.
+    
+    Over-fetches DEDUP_OVERFETCH times the requested size and doubles the window
+    (up to DEDUP_MAX_FETCH) until enough unique documents are found.
+    
+    Args:
+        index: Elasticsearch index to search
+        search_body: Elasticsearch search request body
+        size: Number of unique documents to return
+        dedup: Whether to collapse duplicate documents
+    
+    Returns:
+        Formatted search results with the number of duplicates folded
+    """
+    if not dedup:
+        results = await cached_search(index, search_body)
+        for document in results.get("documents", []):
+            document["source"].pop("content_hash", None)
+        return results
+    
+    fetch_size = dedup_fetch_size(size)
+    while True:
+        results = await cached_search(index, resize_search_body(search_body, fetch_size))
+        if "documents" not in results:
+            return results
+        
+        fetched = len(results["documents"])
+        results = await asyncio.to_thread(collapse_results, results, size)
+        if len(results["documents"]) >= size or fetched < fetch_size or fetch_size >= DEDUP_MAX_FETCH:
+            return results
+        fetch_size = min(fetch_size * 2, DEDUP_MAX_FETCH)
+
 def format_search_results(results: Dict[str, Any]) -> Dict[str, Any]:
     """Format search results for better readability"""
     if "hits" not in results:
@@ -152,33 +552,14 @@ def format_search_results(results: Dict[str, Any]) -> Dict[str, Any]:
         "documents": formatted_hits
     }
 
-@mcp.tool
-async def search(
+def build_search_body(
     query: str,
-    index: str = ES_DEFAULT_INDEX,
     size: int = 5,
     highlight: bool = True,
     fragment_size: int = 600,
-    num_fragments: int = 5,
-    ctx: Context = None
+    num_fragments: int = 5
 ) -> Dict[str, Any]:
-    """
-    Perform a traditional keyword search on Elasticsearch.
-    
-    Args:
-        query: Search query string
-        index: Elasticsearch index to search (default: documents)
-        size: Number of results to return (default: 5)
-        highlight: Whether to include highlighted text fragments (default: True)
-        fragment_size: Size of highlighted fragments in characters (default: 600)
-        num_fragments: Number of fragments to return per document (default: 5)
-    
-    Returns:
-        Search results with document content and metadata
-    """
-    if ctx:
-        await ctx.info(f"Performing keyword search for: '{query}' on index '{index}'")
-    
+    """Build the request body for a keyword search"""
     search_body = {
         "query": {
             "multi_match": {
@@ -200,50 +581,25 @@ async def search(
                 }
             }
         }
-        search_body["_source"] = ["file.filename", "path.virtual"]
+        search_body["_source"] = ["file.filename", "path.virtual", "content_hash"]
     else:
-        search_body["_source"] = ["content", "file.filename", "path.virtual"]
+        search_body["_source"] = ["content", "file.filename", "path.virtual", "content_hash"]
     
-    try:
-        results = await elasticsearch_request("POST", f"{index}/_search", search_body)
-        formatted_results = format_search_results(results)
-        
-        # if ctx:
-        #     await ctx.info(f"Found {formatted_results['total_hits']} documents in {formatted_results.get('took_ms', 0)}ms")
-        
-        return formatted_results
-    except Exception as e:
-        if ctx:
-            await ctx.error(f"Search failed: {str(e)}")
-        raise
+    return search_body
 
-@mcp.tool
-async def semantic_search(
+def build_semantic_search_body(
     query: str,
-    index: str = ES_DEFAULT_INDEX,
     size: int = 5,
     highlight: bool = True,
     fragment_size: int = 600,
-    num_fragments: int = 5,
-    ctx: Context = None
+    num_fragments: int = 5
 ) -> Dict[str, Any]:
     """
-    Perform AI-powered semantic search using the E5 model.
+    Build the request body for a semantic search.
     
-    Args:
-        query: Search query string (can be natural language)
-        index: Elasticsearch index to search (default: documents)
-        size: Number of results to return (default: 5)
-        highlight: Whether to include highlighted text fragments (default: True)
-        fragment_size: Size of highlighted fragments in characters (default: 600)
-        num_fragments: Number of fragments to return per document (default: 5)
-    
-    Returns:
-        Semantic search results with document content and relevance scores
+    Without highlighting, returns `content` but not the `content_semantic`
+    embedding chunks, which would only repeat the content at several times its size.
     """
-    if ctx:
-        await ctx.info(f"Performing semantic search for: '{query}' on index '{index}'")
-    
     if highlight:
         # For semantic search with highlighting, use a hybrid approach
         search_body = {
@@ -277,7 +633,7 @@ async def semantic_search(
                     }
                 }
             },
-            "_source": ["file.filename", "path.virtual"],
+            "_source": ["file.filename", "path.virtual", "content_hash"],
             "size": size
         }
     else:
@@ -289,54 +645,22 @@ async def semantic_search(
                     "query": query
                 }
             },
-            "_source": ["content", "content_semantic", "file.filename", "path.virtual"],
+            "_source": ["content", "file.filename", "path.virtual", "content_hash"],
             "size": size
         }
     
-    try:
-        results = await elasticsearch_request("POST", f"{index}/_search", search_body)
-        formatted_results = format_search_results(results)
-        
-        # if ctx:
-        #     await ctx.info(f"Found {formatted_results['total_hits']} documents in {formatted_results.get('took_ms', 0)}ms using semantic search")
-        
-        return formatted_results
-    except Exception as e:
-        if ctx:
-            await ctx.error(f"Semantic search failed: {str(e)}")
-        raise
+    return search_body
 
-@mcp.tool
-async def hybrid_search(
+def build_hybrid_search_body(
     query: str,
-    index: str = ES_DEFAULT_INDEX,
     size: int = 5,
     highlight: bool = True,
     fragment_size: int = 600,
     num_fragments: int = 5,
     rank_window_size: int = 50,
-    rank_constant: int = 20,
-    ctx: Context = None
+    rank_constant: int = 20
 ) -> Dict[str, Any]:
-    """
-    Perform hybrid search combining keyword and semantic search using RRF (Reciprocal Rank Fusion).
-    
-    Args:
-        query: Search query string
-        index: Elasticsearch index to search (default: documents)
-        size: Number of results to return (default: 5)
-        highlight: Whether to include highlighted text fragments (default: True)
-        fragment_size: Size of highlighted fragments in characters (default: 600)
-        num_fragments: Number of fragments to return per document (default: 5)
-        rank_window_size: RRF rank window size (default: 50)
-        rank_constant: RRF rank constant (default: 20)
-    
-    Returns:
-        Hybrid search results combining keyword and semantic search
-    """
-    if ctx:
-        await ctx.info(f"Performing hybrid search for: '{query}' on index '{index}'")
-    
+    """Build the request body for a hybrid RRF search"""
     search_body = {
         "retriever": {
             "rrf": {
@@ -380,13 +704,141 @@ async def hybrid_search(
                 }
             }
         }
-        search_body["_source"] = ["file.filename", "path.virtual"]
+        search_body["_source"] = ["file.filename", "path.virtual", "content_hash"]
     else:
-        search_body["_source"] = ["content", "file.filename", "path.virtual"]
+        search_body["_source"] = ["content", "file.filename", "path.virtual", "content_hash"]
+    
+    return search_body
+
+@mcp.tool
+@traced
+async def search(
+    query: str,
+    index: str = ES_DEFAULT_INDEX,
+    size: int = 5,
+    highlight: bool = True,
+    fragment_size: int = 600,
+    num_fragments: int = 5,
+    dedup: bool = True,
+    ctx: Context = None
+) -> Dict[str, Any]:
+    """
+    Perform a traditional keyword search on Elasticsearch.
+    
+    Args:
+        query: Search query string
+        index: Elasticsearch index to search (default: documents)
+        size: Number of results to return (default: 5)
+        highlight: Whether to include highlighted text fragments (default: True)
+        fragment_size: Size of highlighted fragments in characters (default: 600)
+        num_fragments: Number of fragments to return per document (default: 5)
+        dedup: Whether to collapse duplicate copies of the same document (default: True)
+    
+    Returns:
+        Search results with document content and metadata
+    """
+    if ctx:
+        await ctx.info(f"Performing keyword search for: '{query}' on index '{index}'")
+    
+    search_body = build_search_body(query, size, highlight, fragment_size, num_fragments)
     
     try:
-        results = await elasticsearch_request("POST", f"{index}/_search", search_body)
-        formatted_results = format_search_results(results)
+        formatted_results = await search_unique(index, search_body, size, dedup)
+        
+        # if ctx:
+        #     await ctx.info(f"Found {formatted_results['total_hits']} documents in {formatted_results.get('took_ms', 0)}ms")
+        
+        return formatted_results
+    except Exception as e:
+        if ctx:
+            await ctx.error(f"Search failed: {str(e)}")
+        raise
+
+@mcp.tool
+@traced
+async def semantic_search(
+    query: str,
+    index: str = ES_DEFAULT_INDEX,
+    size: int = 5,
+    highlight: bool = True,
+    fragment_size: int = 600,
+    num_fragments: int = 5,
+    dedup: bool = True,
+    ctx: Context = None
+) -> Dict[str, Any]:
+    """
+    Perform AI-powered semantic search using the E5 model.
+    
+    Args:
+        query: Search query string (can be natural language)
+        index: Elasticsearch index to search (default: documents)
+        size: Number of results to return (default: 5)
+        highlight: Whether to include highlighted text fragments (default: True)
+        fragment_size: Size of highlighted fragments in characters (default: 600)
+        num_fragments: Number of fragments to return per document (default: 5)
+        dedup: Whether to collapse duplicate copies of the same document (default: True)
+    
+    Returns:
+        Semantic search results with document content and relevance scores
+        (without the content_semantic embedding chunks)
+    """
+    if ctx:
+        await ctx.info(f"Performing semantic search for: '{query}' on index '{index}'")
+    
+    search_body = build_semantic_search_body(query, size, highlight, fragment_size, num_fragments)
+    
+    try:
+        formatted_results = await search_unique(index, search_body, size, dedup)
+        
+        # if ctx:
+        #     await ctx.info(f"Found {formatted_results['total_hits']} documents in {formatted_results.get('took_ms', 0)}ms using semantic search")
+        
+        return formatted_results
+    except Exception as e:
+        if ctx:
+            await ctx.error(f"Semantic search failed: {str(e)}")
+        raise
+
+@mcp.tool
+@traced
+async def hybrid_search(
+    query: str,
+    index: str = ES_DEFAULT_INDEX,
+    size: int = 5,
+    highlight: bool = True,
+    fragment_size: int = 600,
+    num_fragments: int = 5,
+    rank_window_size: int = 50,
+    rank_constant: int = 20,
+    dedup: bool = True,
+    ctx: Context = None
+) -> Dict[str, Any]:
+    """
+    Perform hybrid search combining keyword and semantic search using RRF (Reciprocal Rank Fusion).
+    
+    Args:
+        query: Search query string
+        index: Elasticsearch index to search (default: documents)
+        size: Number of results to return (default: 5)
+        highlight: Whether to include highlighted text fragments (default: True)
+        fragment_size: Size of highlighted fragments in characters (default: 600)
+        num_fragments: Number of fragments to return per document (default: 5)
+        rank_window_size: RRF rank window size (default: 50)
+        rank_constant: RRF rank constant (default: 20)
+        dedup: Whether to collapse duplicate copies of the same document (default: True)
+    
+    Returns:
+        Hybrid search results combining keyword and semantic search
+    """
+    if ctx:
+        await ctx.info(f"Performing hybrid search for: '{query}' on index '{index}'")
+    
+    search_body = build_hybrid_search_body(
+        query, size, highlight, fragment_size, num_fragments, rank_window_size, rank_constant
+    )
+    
+    try:
+        formatted_results = await search_unique(index, search_body, size, dedup)
         
         # if ctx:
         #     await ctx.info(f"Found {formatted_results['total_hits']} documents in {formatted_results.get('took_ms', 0)}ms using hybrid search")
@@ -398,6 +850,7 @@ async def hybrid_search(
         raise
 
 @mcp.tool
+@traced
 async def count_documents(
     index: str = ES_DEFAULT_INDEX,
     query: Optional[str] = None,
@@ -444,6 +897,7 @@ async def count_documents(
         raise
 
 @mcp.tool
+@traced
 async def list_indices(ctx: Context = None) -> Dict[str, Any]:
     """
     List all available Elasticsearch indices.
@@ -478,6 +932,7 @@ async def list_indices(ctx: Context = None) -> Dict[str, Any]:
         raise
 
 @mcp.tool
+@traced
 async def health_check(ctx: Context = None) -> Dict[str, Any]:
     """
     Check Elasticsearch cluster health and connectivity.
@@ -512,6 +967,7 @@ async def health_check(ctx: Context = None) -> Dict[str, Any]:
         raise
 
 @mcp.tool
+@traced
 async def get_document(
     document_id: str,
     index: str = ES_DEFAULT_INDEX,
@@ -569,7 +1025,8 @@ async def get_search_stats(ctx: Context = None) -> Dict[str, Any]:
             "search_time_ms": total_stats["search"]["query_time_in_millis"],
             "avg_search_time_ms": round(total_stats["search"]["query_time_in_millis"] / max(total_stats["search"]["query_total"], 1), 2),
             "current_searches": total_stats["search"]["query_current"],
-            "indices": list(stats_results["indices"].keys())
+            "indices": list(stats_results["indices"].keys()),
+            "mcp_cache": await read_cache_counters() if CACHE_TTL_SECONDS > 0 else None
         }
     except Exception as e:
         if ctx:
@@ -610,10 +1067,12 @@ async def get_index_info(index_name: str, ctx: Context = None) -> Dict[str, Any]
 async def cleanup():
     """Cleanup resources"""
     global es_client
+    await flush_cache_counters()
     if es_client:
         await es_client.aclose()
 
 @mcp.tool
+@traced
 async def server_health() -> Dict[str, Any]:
     """
     Simple health check endpoint for Docker health monitoring.
@@ -627,10 +1086,41 @@ async def server_health() -> Dict[str, Any]:
         "timestamp": asyncio.get_event_loop().time()
     }
 
+def create_app():
+    """
+    Build the ASGI app for multi-worker serving.
+    
+    Uses stateless HTTP so any worker can answer any request; MCP sessions
+    held in one process would not be visible to the others. Each worker flushes
+    its cache counters on a timer and runs cleanup() when it shuts down, since
+    the cleanup in __main__ only runs in the parent process.
+    """
+    app = mcp.http_app(stateless_http=True)
+    mcp_lifespan = app.router.lifespan_context
+    
+    @asynccontextmanager
+    async def lifespan(app):
+        async with mcp_lifespan(app):
+            flusher = asyncio.create_task(flush_cache_counters_periodically())
+            try:
+                yield
+            finally:
+                flusher.cancel()
+                await cleanup()
+    
+    app.router.lifespan_context = lifespan
+    return app
+
 if __name__ == "__main__":
     try:
         # Run the MCP server
-        mcp.run(transport="http", host="0.0.0.0", port=8080)
+        if MCP_WORKERS > 1:
+            import uvicorn
+            
+            # uvicorn binds the socket once and forks workers that share it
+            uvicorn.run("server:create_app", factory=True, host=MCP_HOST, port=MCP_PORT, workers=MCP_WORKERS)
+        else:
+            mcp.run(transport="http", host=MCP_HOST, port=MCP_PORT)
     except KeyboardInterrupt:
         print("\nShutting down MCP server...")
     finally: